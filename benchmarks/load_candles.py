@@ -0,0 +1,161 @@
+"""Сравнение загрузки файлов свечей: старый путь (read_csv + приведение типов) и load_candles
+
+Старый путь читает файлы прежнего формата со строками времени, load_candles -
+файлы, которые сейчас пишут фетчеры (время свечи в колонке candle_time_ms).
+Память считается через tracemalloc: пик во время загрузки и объем, который
+остается занятым загруженной таблицей.
+
+Запуск из корня репозитория:
+    python -m benchmarks.load_candles --markets 150 --days 14
+"""
+import argparse
+import gc
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from data_combiner import DataValidationError, load_candles, logger
+
+# Колонки и типы, которые проверял DataCombiner до load_candles
+LEGACY_REQUIRED_COLUMNS = {
+    'upbit': {
+        'market': str,
+        'candle_date_time_utc': str,
+        'opening_price': float,
+        'high_price': float,
+        'low_price': float,
+        'trade_price': float,
+        'candle_acc_trade_volume': float
+    },
+    'binance': {
+        'market': str,
+        'candle_date_time_utc': str,
+        'opening_price': float,
+        'high_price': float,
+        'low_price': float,
+        'close_price': float,
+        'volume': float
+    }
+}
+
+def generate_frames(markets: int, days: int) -> dict:
+    """Синтетические свечи в формате get_data_upbit / get_data_binance"""
+    rng = np.random.default_rng(0)
+    times = pd.date_range(end=pd.Timestamp('2024-11-30 14:00'), periods=days * 288, freq='5min')
+    names = np.repeat([f"COIN{i}/USDT" for i in range(markets)], len(times))
+    times = pd.DatetimeIndex(np.tile(times, markets))
+    times_ms = times.to_numpy(dtype='datetime64[ms]').astype('int64')
+    prices = rng.uniform(0.01, 1000, len(names))
+
+    upbit = pd.DataFrame({
+        'market': names,
+        'source': 'Upbit',
+        'candle_date_time_utc': times.strftime('%Y-%m-%dT%H:%M:%S'),
+        'opening_price': prices,
+        'high_price': prices * 1.01,
+        'low_price': prices * 0.99,
+        'trade_price': prices,
+        'candle_acc_trade_volume': rng.uniform(0, 1e6, len(names)),
+        'candle_acc_trade_price': rng.uniform(0, 1e9, len(names)),
+        'candle_time_ms': times_ms
+    })
+    binance = pd.DataFrame({
+        'market': names,
+        'candle_time_ms': times_ms,
+        'opening_price': prices,
+        'high_price': prices * 1.01,
+        'low_price': prices * 0.99,
+        'close_price': prices,
+        'volume': rng.uniform(0, 1e6, len(names)),
+        'quote_volume': rng.uniform(0, 1e9, len(names)),
+        'market_type': 'spot'
+    })
+
+    # Прежний формат: время только строками, у Upbit еще и время последней сделки
+    legacy_upbit = upbit.drop(columns='candle_time_ms')
+    legacy_upbit['timestamp'] = times.astype(str)
+    legacy_binance = binance.drop(columns='candle_time_ms')
+    legacy_binance.insert(1, 'candle_date_time_utc', times.strftime('%Y-%m-%d %H:%M:%S'))
+
+    return {
+        ('upbit', 'legacy'): legacy_upbit,
+        ('upbit', 'typed'): upbit,
+        ('binance', 'legacy'): legacy_binance,
+        ('binance', 'typed'): binance
+    }
+
+def load_legacy(file_path: str, source: str) -> pd.DataFrame:
+    """Путь загрузки, которым combine_data пользовался до load_candles
+
+    Повторяет validate_input_data и _process_datetime прежнего DataCombiner.
+    """
+    df = pd.read_csv(file_path)
+    logger.info(f"Validating {source} data")
+    if df.empty:
+        raise DataValidationError(f"{source} data is empty")
+    df.columns = df.columns.str.strip().str.lower()
+    for col, expected_type in LEGACY_REQUIRED_COLUMNS[source].items():
+        if col not in df.columns:
+            raise DataValidationError(f"Missing column {col} in {source} data")
+        if expected_type in (float, int):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        elif expected_type == str:
+            df[col] = df[col].astype(str)
+
+    df['candle_date_time_utc'] = pd.to_datetime(df['candle_date_time_utc'], errors='coerce')
+    if df['candle_date_time_utc'].isnull().any():
+        logger.warning("Found invalid dates in candle_date_time_utc")
+    return df
+
+def measure(loader, file_path: str, source: str, repeat: int) -> dict:
+    """Лучшее время загрузки, пиковая и удерживаемая таблицей память"""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        loader(file_path, source)
+        timings.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    df = loader(file_path, source)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del df
+
+    return {
+        'seconds': min(timings),
+        'peak_mb': peak / 2**20,
+        'retained_mb': retained / 2**20
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--markets', type=int, default=150)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    loaders = {'legacy': load_legacy, 'typed': load_candles}
+    with tempfile.TemporaryDirectory() as directory:
+        files = {}
+        for (source, path), frame in generate_frames(args.markets, args.days).items():
+            files[source, path] = os.path.join(directory, f"{source}_{path}.csv")
+            frame.to_csv(files[source, path], index=False)
+
+        print(f"{args.markets} markets x {args.days * 288} candles per source")
+        print(f"{'source':<8} {'path':<7} {'load, s':>9} {'peak, MB':>9} {'retained, MB':>13}")
+        for (source, path), file_path in files.items():
+            result = measure(loaders[path], file_path, source, args.repeat)
+            print(f"{source:<8} {path:<7} {result['seconds']:>9.3f} "
+                  f"{result['peak_mb']:>9.1f} {result['retained_mb']:>13.1f}")
+
+if __name__ == "__main__":
+    main()
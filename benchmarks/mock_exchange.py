@@ -0,0 +1,328 @@
+"""Локальная имитация API Upbit и Binance для офлайн-прогонов пайплайна
+
+Отдает /v1/market/all, /v1/ticker, /v1/candles/minutes/5 (Upbit) и
+/api/v3/klines, /fapi/v1/klines (Binance) с одного адреса. Данные синтетические
+(детерминированные по рынку и времени) либо из записанного JSON-файла:
+
+    {
+        "upbit": {"KRW-BTC": [<свечи в формате ответа Upbit>, ...]},
+        "binance": {"BTCUSDT": [<klines в формате ответа Binance>, ...]}
+    }
+
+Фетчеры запрашивают окна относительно текущего времени (Upbit - сутки до
+now-4h, Binance - последние сутки), поэтому запись при загрузке сдвигается так,
+чтобы самая новая свеча пришлась на текущий 5-минутный интервал. Записи нужно
+покрывать не меньше 28 часов.
+
+Счетчики запросов отдает GET /_mock/stats, сбрасывает POST /_mock/reset; эти
+служебные пути не считаются и не задерживаются.
+
+Запуск отдельно (--port 0 - свободный порт, адрес печатается первой строкой):
+    python -m benchmarks.mock_exchange --markets 150 --latency 0.05 --rate-limit-ratio 0.01
+
+Воспроизведение записи целиком через пайплайн:
+    python -m benchmarks.mock_exchange --markets 10 --dump-fixtures /tmp/fixtures.json \\
+        --dump-end 2024-11-30T14:00:00
+    python -m benchmarks.pipeline --fixtures /tmp/fixtures.json --cycles 1
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from aiohttp import web
+
+CANDLE_INTERVAL_MS = 5 * 60 * 1000
+KRW_USDT_RATE = 1400.0
+# Премия Upbit над Binance в синтетических данных
+SYNTHETIC_PREMIUM = 0.02
+
+def _to_utc_string(open_ms: int, offset_hours: int = 0) -> str:
+    """Время свечи в формате Upbit"""
+    moment = datetime.fromtimestamp(open_ms / 1000, tz=timezone.utc) + timedelta(hours=offset_hours)
+    return moment.strftime('%Y-%m-%dT%H:%M:%S')
+
+class MockExchange:
+    """HTTP-сервер с эндпоинтами Upbit и Binance, задержками и внедряемыми ошибками"""
+
+    def __init__(self, markets: int = 150, latency: float = 0.0, rate_limit_ratio: float = 0.0,
+                 error_ratio: float = 0.0, fixtures: Optional[str] = None, seed: int = 0,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.error_ratio = error_ratio
+        self.host = host
+        self.port = port
+        self.request_counts = Counter()  # (путь, статус) -> число запросов
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+
+        self.recorded: Dict[str, Dict[str, list]] = {'upbit': {}, 'binance': {}}
+        if fixtures:
+            with open(fixtures) as f:
+                self.recorded.update(json.load(f))
+            self._shift_recorded()
+            self.markets = sorted(self.recorded['upbit'])
+        else:
+            self.markets = [f"KRW-C{i:04d}" for i in range(markets)]
+        self._known_markets = set(self.markets)
+        self._known_assets = {market.replace('KRW-', '') for market in self.markets}
+
+    def _shift_recorded(self) -> None:
+        """Перенос записи так, чтобы самая новая свеча пришлась на текущий интервал
+
+        Сдвиг общий для всех рядов, чтобы свечи Upbit и Binance за одно время
+        остались сопоставимыми после переноса.
+        """
+        upbit_open_ms = {
+            market: [int(datetime.fromisoformat(candle['candle_date_time_utc'])
+                         .replace(tzinfo=timezone.utc).timestamp() * 1000) for candle in candles]
+            for market, candles in self.recorded['upbit'].items()
+        }
+        newest = max([max(opens) for opens in upbit_open_ms.values() if opens] +
+                     [kline[0] for klines in self.recorded['binance'].values() for kline in klines],
+                     default=None)
+        if newest is None:
+            return
+        now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+        shift = (now_ms - now_ms % CANDLE_INTERVAL_MS) - (newest - newest % CANDLE_INTERVAL_MS)
+
+        for market, candles in self.recorded['upbit'].items():
+            shifted = []
+            for candle, open_ms in zip(candles, upbit_open_ms[market]):
+                candle = dict(candle)
+                candle['candle_date_time_utc'] = _to_utc_string(open_ms + shift)
+                candle['candle_date_time_kst'] = _to_utc_string(open_ms + shift, offset_hours=9)
+                if 'timestamp' in candle:
+                    candle['timestamp'] += shift
+                shifted.append(candle)
+            # Upbit отдает свечи от новых к старым
+            self.recorded['upbit'][market] = sorted(shifted, key=lambda c: c['candle_date_time_utc'],
+                                                    reverse=True)
+        for symbol, klines in self.recorded['binance'].items():
+            self.recorded['binance'][symbol] = sorted(
+                ([kline[0] + shift, *kline[1:6], kline[6] + shift, *kline[7:]] for kline in klines),
+                key=lambda kline: kline[0]
+            )
+
+    def dump_fixtures(self, path: str, end_ms: int, hours: int = 48) -> None:
+        """Запись синтетических данных за hours часов до end_ms в формате fixtures"""
+        last_open_ms = end_ms - end_ms % CANDLE_INTERVAL_MS
+        open_times = [last_open_ms - i * CANDLE_INTERVAL_MS
+                      for i in range(hours * 3600 * 1000 // CANDLE_INTERVAL_MS)]
+        fixtures = {
+            'upbit': {market: [self._upbit_candle(market, open_ms) for open_ms in open_times]
+                      for market in self.markets},
+            'binance': {f"{market.replace('KRW-', '')}USDT": [
+                self._binance_kline(f"{market.replace('KRW-', '')}USDT", open_ms)
+                for open_ms in reversed(open_times)] for market in self.markets}
+        }
+        with open(path, 'w') as f:
+            json.dump(fixtures, f)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def _build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._faults_middleware])
+        app.router.add_get('/v1/market/all', self._market_all)
+        app.router.add_get('/v1/ticker', self._ticker)
+        app.router.add_get('/v1/candles/minutes/5', self._upbit_candles)
+        app.router.add_get('/api/v3/klines', self._klines)
+        app.router.add_get('/fapi/v1/klines', self._klines)
+        app.router.add_get('/_mock/stats', self._stats)
+        app.router.add_post('/_mock/reset', self._reset)
+        return app
+
+    async def start(self) -> None:
+        """Запуск сервера; при port=0 занимает свободный порт"""
+        self._runner = web.AppRunner(self._build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @web.middleware
+    async def _faults_middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        """Задержка ответа и случайные 429/500 перед обработчиком"""
+        if request.path.startswith('/_mock/'):
+            return await handler(request)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        roll = self._random.random()
+        if roll < self.rate_limit_ratio:
+            response = web.json_response({'error': {'name': 'too_many_requests'}}, status=429,
+                                         headers={'Retry-After': '1'})
+        elif roll < self.rate_limit_ratio + self.error_ratio:
+            response = web.json_response({'error': {'name': 'internal_error'}}, status=500)
+        else:
+            response = await handler(request)
+
+        self.request_counts[(request.path, response.status)] += 1
+        return response
+
+    def _synthetic_price(self, asset: str, open_ms: int) -> float:
+        """Детерминированная цена в USDT для актива и времени"""
+        base = 0.01 + zlib.crc32(asset.encode()) % 100000 / 10
+        return base * (1 + 0.05 * math.sin(open_ms / 3_600_000 + len(asset)))
+
+    def _synthetic_ohlcv(self, asset: str, open_ms: int) -> tuple:
+        opening = self._synthetic_price(asset, open_ms)
+        closing = self._synthetic_price(asset, open_ms + CANDLE_INTERVAL_MS)
+        volume = 10 + zlib.crc32(f"{asset}{open_ms}".encode()) % 1000
+        return opening, max(opening, closing) * 1.001, min(opening, closing) * 0.999, closing, volume
+
+    def _upbit_candle(self, market: str, open_ms: int) -> dict:
+        scale = KRW_USDT_RATE * (1 + SYNTHETIC_PREMIUM)
+        opening, high, low, closing, volume = self._synthetic_ohlcv(market.replace('KRW-', ''), open_ms)
+        return {
+            'market': market,
+            'candle_date_time_utc': _to_utc_string(open_ms),
+            'candle_date_time_kst': _to_utc_string(open_ms, offset_hours=9),
+            'opening_price': opening * scale,
+            'high_price': high * scale,
+            'low_price': low * scale,
+            'trade_price': closing * scale,
+            'timestamp': open_ms + CANDLE_INTERVAL_MS - 1,
+            'candle_acc_trade_price': volume * closing * scale,
+            'candle_acc_trade_volume': volume,
+            'unit': 5
+        }
+
+    def _binance_kline(self, symbol: str, open_ms: int) -> list:
+        opening, high, low, closing, volume = self._synthetic_ohlcv(symbol[:-len('USDT')], open_ms)
+        return [open_ms, str(opening), str(high), str(low), str(closing), str(volume),
+                open_ms + CANDLE_INTERVAL_MS - 1, str(volume * closing), 100,
+                str(volume / 2), str(volume * closing / 2), '0']
+
+    async def _market_all(self, request: web.Request) -> web.Response:
+        return web.json_response([
+            {'market': market, 'korean_name': market, 'english_name': market}
+            for market in self.markets + ['KRW-USDT']
+        ])
+
+    async def _ticker(self, request: web.Request) -> web.Response:
+        now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+        tickers = []
+        for market in request.query.get('markets', '').split(','):
+            if market == 'KRW-USDT':
+                price = KRW_USDT_RATE
+            elif market in self._known_markets:
+                price = self._upbit_candle(market, now_ms - now_ms % CANDLE_INTERVAL_MS)['trade_price']
+            else:
+                continue
+            tickers.append({'market': market, 'trade_price': price, 'timestamp': now_ms})
+        if not tickers:
+            return web.json_response({'error': {'name': 'Code not found'}}, status=404)
+        return web.json_response(tickers)
+
+    async def _upbit_candles(self, request: web.Request) -> web.Response:
+        """Свечи Upbit от новых к старым, строго раньше параметра to"""
+        market = request.query.get('market', '')
+        if market not in self._known_markets:
+            return web.json_response({'error': {'name': 'Code not found'}}, status=404)
+        count = min(int(request.query.get('count', 1)), 200)
+
+        to = request.query.get('to')
+        if to:
+            to_time = datetime.fromisoformat(to.replace(' ', 'T').rstrip('Z'))
+            end_ms = int(to_time.replace(tzinfo=timezone.utc).timestamp() * 1000)
+        else:
+            end_ms = int(datetime.now(timezone.utc).timestamp() * 1000) + CANDLE_INTERVAL_MS
+
+        if market in self.recorded['upbit']:
+            cutoff = _to_utc_string(end_ms)
+            candles = [candle for candle in self.recorded['upbit'][market]
+                       if candle['candle_date_time_utc'] < cutoff]
+            return web.json_response(candles[:count])
+
+        last_open_ms = (end_ms - 1) // CANDLE_INTERVAL_MS * CANDLE_INTERVAL_MS
+        return web.json_response([
+            self._upbit_candle(market, last_open_ms - i * CANDLE_INTERVAL_MS) for i in range(count)
+        ])
+
+    async def _klines(self, request: web.Request) -> web.Response:
+        """Klines Binance от старых к новым в интервале [startTime, endTime]"""
+        symbol = request.query.get('symbol', '')
+        if symbol not in self.recorded['binance'] and symbol[:-len('USDT')] not in self._known_assets:
+            return web.json_response({'code': -1121, 'msg': 'Invalid symbol.'}, status=400)
+        limit = min(int(request.query.get('limit', 500)), 1000)
+        end_ms = int(request.query.get('endTime', datetime.now(timezone.utc).timestamp() * 1000))
+        start_ms = int(request.query.get('startTime', end_ms - limit * CANDLE_INTERVAL_MS))
+
+        if symbol in self.recorded['binance']:
+            klines = [kline for kline in self.recorded['binance'][symbol] if start_ms <= kline[0] <= end_ms]
+            return web.json_response(klines[:limit])
+
+        first_open_ms = -(-start_ms // CANDLE_INTERVAL_MS) * CANDLE_INTERVAL_MS
+        open_times = range(first_open_ms, end_ms + 1, CANDLE_INTERVAL_MS)
+        return web.json_response([self._binance_kline(symbol, open_ms) for open_ms in open_times[:limit]])
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response({'markets': len(self.markets), 'requests': self.request_summary()})
+
+    async def _reset(self, request: web.Request) -> web.Response:
+        self.request_counts.clear()
+        return web.json_response({'status': 'ok'})
+
+    def request_summary(self) -> dict:
+        """Сводка запросов: всего, по статусам и по путям"""
+        by_status = Counter()
+        by_path = Counter()
+        for (path, status), count in self.request_counts.items():
+            by_status[status] += count
+            by_path[path] += count
+        return {
+            'total': sum(self.request_counts.values()),
+            'by_status': {str(status): count for status, count in sorted(by_status.items())},
+            'by_path': dict(sorted(by_path.items()))
+        }
+
+async def serve(exchange: MockExchange) -> None:
+    await exchange.start()
+    print(f"Mock exchange with {len(exchange.markets)} markets listening on {exchange.url}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await exchange.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--markets', type=int, default=150)
+    parser.add_argument('--latency', type=float, default=0.0, help="Response delay, seconds")
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.0, help="Share of 429 responses")
+    parser.add_argument('--error-ratio', type=float, default=0.0, help="Share of 500 responses")
+    parser.add_argument('--fixtures', help="JSON file with recorded responses")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--port', type=int, default=8080, help="0 picks a free port")
+    parser.add_argument('--dump-fixtures', help="Write synthetic data as a fixtures file and exit")
+    parser.add_argument('--dump-end', help="Newest candle time for --dump-fixtures (UTC, default now)")
+    args = parser.parse_args()
+
+    exchange = MockExchange(markets=args.markets, latency=args.latency,
+                            rate_limit_ratio=args.rate_limit_ratio, error_ratio=args.error_ratio,
+                            fixtures=args.fixtures, seed=args.seed, port=args.port)
+    if args.dump_fixtures:
+        end = datetime.fromisoformat(args.dump_end) if args.dump_end else datetime.now(timezone.utc)
+        exchange.dump_fixtures(args.dump_fixtures, int(end.replace(tzinfo=timezone.utc).timestamp() * 1000))
+        print(f"Fixtures for {len(exchange.markets)} markets written to {args.dump_fixtures}")
+        return
+    try:
+        asyncio.run(serve(exchange))
+    except KeyboardInterrupt:
+        print("\nMock exchange stopped")
+
+if __name__ == "__main__":
+    main()
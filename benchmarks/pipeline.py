@@ -0,0 +1,294 @@
+"""Сквозной бенчмарк циклов main.py на локальной имитации бирж
+
+Для каждого масштаба MockExchange и пайплайн запускаются в двух отдельных
+процессах, чтобы генерация ответов и память биржи не попадали в замеры:
+фетчеры Upbit и Binance ходят на адрес биржи, затем данные сохраняются и
+объединяются DataCombiner, как в main.py. Запросы считает сама биржа.
+Пиковый RSS на Linux сбрасывается перед каждым циклом (peak_rss_scope=cycle),
+на других системах это пик процесса с начала прогона (peak_rss_scope=process).
+
+Результаты дописываются в историю (JSON Lines), и каждый прогон сравнивается
+с предыдущими прогонами на той же машине.
+
+Запуск из корня репозитория:
+    python -m benchmarks.pipeline --scales 10,150,1000 --cycles 2
+    python -m benchmarks.pipeline --fixtures /tmp/fixtures.json --cycles 1
+
+С --fixtures число рынков задает запись, и результаты сохраняются под ним.
+Прогон с регрессиями в историю не пишется, иначе после нескольких медленных
+прогонов он сам стал бы базой; --accept записывает его как новую норму.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SCALES = '10,150,1000'
+DEFAULT_HISTORY = os.path.join(ROOT, 'benchmarks', 'results', 'pipeline.jsonl')
+# Метрики, по которым ищутся регрессии
+TRACKED_METRICS = ('cycle_seconds', 'peak_rss_mb')
+
+def _reset_peak_rss() -> bool:
+    """Сброс пикового RSS процесса (VmHWM, только Linux); False, если сбросить нельзя"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_mb() -> float:
+    """Пиковый RSS процесса: VmHWM на Linux, иначе ru_maxrss (в байтах на macOS)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+async def exchange_stats(session: aiohttp.ClientSession, exchange_url: str, reset: bool = False) -> dict:
+    """Число рынков и счетчики запросов биржи; reset=True обнуляет счетчики"""
+    if reset:
+        async with session.post(f"{exchange_url}/_mock/reset") as response:
+            response.raise_for_status()
+    async with session.get(f"{exchange_url}/_mock/stats") as response:
+        response.raise_for_status()
+        return await response.json()
+
+async def run_cycles(exchange_url: str, cycles: int, keep_delays: bool) -> dict:
+    """Циклы сбора и объединения данных против биржи в другом процессе"""
+    from data_combiner import DataCombiner, logger
+    from get_data_binance import BinanceDataFetcher
+    from get_data_upbit import UpbitDataFetcher
+
+    logger.setLevel(logging.WARNING)
+    async with aiohttp.ClientSession() as session:
+        upbit_fetcher = UpbitDataFetcher(api_url=exchange_url)
+        binance_fetcher = BinanceDataFetcher(spot_url=exchange_url, futures_url=exchange_url)
+        data_combiner = DataCombiner()
+        if not keep_delays:
+            # Клиентские паузы меряют сон, а не пайплайн
+            upbit_fetcher.delay = 0
+            upbit_fetcher.request_delay = 0
+            binance_fetcher.batch_delay = 0
+
+        await upbit_fetcher.fetch_market_pairs()
+        pairs = [f"{pair.replace('KRW-', '')}/USDT" for pair in upbit_fetcher.filtered_pairs]
+
+        results = []
+        for cycle in range(cycles):
+            await exchange_stats(session, exchange_url, reset=True)
+            per_cycle_rss = _reset_peak_rss()
+            upbit_before = len(upbit_fetcher.all_candles_data)
+            binance_before = len(binance_fetcher.all_pairs_data)
+
+            started = time.perf_counter()
+            await asyncio.gather(
+                upbit_fetcher.fetch_all_candles(),
+                binance_fetcher.fetch_all_pairs(pairs)
+            )
+            fetched = time.perf_counter()
+            upbit_fetcher.save_to_csv()
+            binance_fetcher.save_to_csv()
+            saved = time.perf_counter()
+            combined = data_combiner.combine_data('upbit_data.csv', 'binance_historical_data.csv')
+            data_combiner.save_combined_data()
+            data_combiner.save_rollups()
+            finished = time.perf_counter()
+
+            peak_rss_mb = _peak_rss_mb()
+            stats = await exchange_stats(session, exchange_url)
+
+            candles = (len(upbit_fetcher.all_candles_data) - upbit_before +
+                       len(binance_fetcher.all_pairs_data) - binance_before)
+            seconds = finished - started
+            results.append({
+                'cycle': cycle,
+                'cycle_seconds': seconds,
+                'fetch_seconds': fetched - started,
+                'save_seconds': saved - fetched,
+                'combine_seconds': finished - saved,
+                'candles_fetched': candles,
+                'combined_rows': len(combined),
+                'candles_per_second': candles / seconds if seconds else 0.0,
+                'combined_rows_per_second': len(combined) / seconds if seconds else 0.0,
+                'peak_rss_mb': peak_rss_mb,
+                'peak_rss_scope': 'cycle' if per_cycle_rss else 'process',
+                'requests': stats['requests']
+            })
+        return {'markets': stats['markets'], 'cycles': results}
+
+def run_worker(args) -> None:
+    """Прогон одного масштаба в чистом процессе и временном каталоге"""
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull:
+        os.chdir(directory)
+        with contextlib.redirect_stdout(devnull):
+            run = asyncio.run(run_cycles(args.exchange_url, args.cycles, args.keep_delays))
+    print(json.dumps(run))
+
+def start_exchange(markets: Optional[int], args) -> tuple:
+    """Запуск MockExchange отдельным процессом на свободном порту: (процесс, адрес)"""
+    command = [sys.executable, '-m', 'benchmarks.mock_exchange', '--port', '0',
+               '--latency', str(args.latency), '--rate-limit-ratio', str(args.rate_limit_ratio),
+               '--error-ratio', str(args.error_ratio)]
+    if markets is not None:
+        command += ['--markets', str(markets)]
+    if args.fixtures:
+        command += ['--fixtures', os.path.abspath(args.fixtures)]
+    exchange = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    # Первая строка: "Mock exchange with N markets listening on http://host:port"
+    line = exchange.stdout.readline()
+    if 'listening on ' not in line:
+        exchange.kill()
+        exchange.wait()
+        raise RuntimeError(f"Mock exchange for {markets or 'recorded'} markets failed to start")
+    return exchange, line.rsplit('listening on ', 1)[1].strip()
+
+def run_scale(markets: Optional[int], args) -> dict:
+    """Прогон пайплайна и биржи в отдельных процессах; markets=None - рынки из записи"""
+    exchange, exchange_url = start_exchange(markets, args)
+    try:
+        command = [sys.executable, '-m', 'benchmarks.pipeline', '--worker',
+                   '--exchange-url', exchange_url, '--cycles', str(args.cycles)]
+        if args.keep_delays:
+            command.append('--keep-delays')
+        completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    finally:
+        exchange.terminate()
+        exchange.wait()
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark worker for {markets or 'recorded'} markets failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_history(path: str) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def find_regressions(run: dict, history: List[dict], threshold: float, window: int = 5) -> List[str]:
+    """Сравнение с медианой последних сопоставимых прогонов (та же машина и параметры)"""
+    previous = [entry for entry in history
+                if entry['host'] == run['host'] and entry['options'] == run['options']][-window:]
+    regressions = []
+    for scale, cycles in run['results'].items():
+        for cycle in cycles:
+            for metric in TRACKED_METRICS:
+                baseline = [entry['results'][scale][cycle['cycle']][metric] for entry in previous
+                            if scale in entry['results'] and len(entry['results'][scale]) > cycle['cycle']]
+                if not baseline:
+                    continue
+                median = statistics.median(baseline)
+                if median and cycle[metric] > median * (1 + threshold):
+                    regressions.append(f"{scale} markets, cycle {cycle['cycle']}: {metric} "
+                                       f"{cycle[metric]:.2f} vs median {median:.2f}")
+    return regressions
+
+def print_report(run: dict) -> None:
+    print(f"{'markets':>7} {'cycle':>5} {'total, s':>9} {'fetch':>7} {'save':>7} {'combine':>8} "
+          f"{'candles/s':>10} {'rows/s':>8} {'rss, MB':>8} {'requests':>9} {'429':>5} {'5xx':>5}")
+    for scale, cycles in run['results'].items():
+        for cycle in cycles:
+            by_status = cycle['requests']['by_status']
+            errors = sum(count for status, count in by_status.items() if status.startswith('5'))
+            print(f"{scale:>7} {cycle['cycle']:>5} {cycle['cycle_seconds']:>9.2f} "
+                  f"{cycle['fetch_seconds']:>7.2f} {cycle['save_seconds']:>7.2f} "
+                  f"{cycle['combine_seconds']:>8.2f} {cycle['candles_per_second']:>10.0f} "
+                  f"{cycle['combined_rows_per_second']:>8.0f} {cycle['peak_rss_mb']:>8.1f} "
+                  f"{cycle['requests']['total']:>9} {by_status.get('429', 0):>5} {errors:>5}")
+    if any(cycle.get('peak_rss_scope') == 'process' for cycles in run['results'].values() for cycle in cycles):
+        print("rss: peak of the whole pipeline process, not of each cycle")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', help=f"Comma-separated market counts (default {DEFAULT_SCALES})")
+    parser.add_argument('--cycles', type=int, default=2, help="First cycle fetches history, the rest are steady")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mock exchange response delay, seconds")
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.0, help="Share of 429 responses")
+    parser.add_argument('--error-ratio', type=float, default=0.0, help="Share of 500 responses")
+    parser.add_argument('--fixtures', help="JSON file with recorded exchange responses")
+    parser.add_argument('--keep-delays', action='store_true', help="Keep the fetchers' client-side sleeps")
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help="JSON Lines file with previous runs")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown vs history median")
+    parser.add_argument('--no-record', action='store_true', help="Do not append this run to the history")
+    parser.add_argument('--accept', action='store_true',
+                        help="Append the run to the history even if it regressed (new baseline)")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--exchange-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+    if args.fixtures and args.scales:
+        parser.error("--scales cannot be used with --fixtures: the recording defines the markets")
+
+    run = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'options': {
+            'cycles': args.cycles,
+            'latency': args.latency,
+            'rate_limit_ratio': args.rate_limit_ratio,
+            'error_ratio': args.error_ratio,
+            'fixtures': os.path.basename(args.fixtures) if args.fixtures else None,
+            'keep_delays': args.keep_delays,
+            # Прогоны с биржей в одном процессе с пайплайном несопоставимы с этими
+            'exchange': 'subprocess'
+        },
+        'results': {}
+    }
+    scales = [None] if args.fixtures else [int(scale) for scale in (args.scales or DEFAULT_SCALES).split(',')]
+    for markets in scales:
+        print(f"Running {markets or 'recorded'} markets...", flush=True)
+        result = run_scale(markets, args)
+        # Ключ - фактическое число рынков на бирже, а не запрошенное
+        run['results'][str(result['markets'])] = result['cycles']
+
+    print_report(run)
+    regressions = find_regressions(run, load_history(args.history), args.threshold)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+
+    if regressions and not args.accept:
+        if not args.no_record:
+            print(f"Run not appended to {args.history}; pass --accept to make it the new baseline")
+    elif not args.no_record:
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(run) + '\n')
+        print(f"Results appended to {args.history}")
+
+    if regressions and not args.accept:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
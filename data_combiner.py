@@ -18,10 +18,251 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Время везде хранится как int64 миллисекунды от эпохи (UTC)
+MS_PER_MINUTE = 60 * 1000
+CANDLE_TIME_COLUMN = 'candle_time_ms'
+# Допустимое расхождение времени свечей Upbit и Binance
+CANDLE_MATCH_TOLERANCE_MS = 2 * MS_PER_MINUTE
+
+# Схемы файлов свечей: нужные колонки с типами и формат строки времени в файле
+CANDLE_SCHEMAS = {
+    'upbit': {
+        'time_column': 'candle_date_time_utc',
+        'time_format': '%Y-%m-%dT%H:%M:%S',
+        'dtypes': {
+            'market': 'category',
+            'opening_price': 'float64',
+            'high_price': 'float64',
+            'low_price': 'float64',
+            'trade_price': 'float64',
+            'candle_acc_trade_volume': 'float64'
+        }
+    },
+    'binance': {
+        'time_column': 'candle_date_time_utc',
+        'time_format': '%Y-%m-%d %H:%M:%S',
+        'dtypes': {
+            'market': 'category',
+            'opening_price': 'float64',
+            'high_price': 'float64',
+            'low_price': 'float64',
+            'close_price': 'float64',
+            'volume': 'float64'
+        }
+    }
+}
+
+# Базовое разрешение свечей
+BASE_RESOLUTION_MS = 5 * MS_PER_MINUTE
+
+# Уровни агрегации (от мелкого к крупному): имя -> ширина интервала в мс
+ROLLUP_LEVELS = {
+    '15m': 15 * MS_PER_MINUTE,
+    '1h': 60 * MS_PER_MINUTE,
+    '4h': 4 * 60 * MS_PER_MINUTE,
+    '1d': 24 * 60 * MS_PER_MINUTE,
+}
+
+# Файлы, через которые агрегаты доступны другим процессам
+COMBINED_DATA_FILE = 'combined_market_data.csv'
+ROLLUP_DIRECTORY = 'rollups'
+
+# Окно пересчета агрегатов: свечи в нем могут быть еще обновлены биржей
+ROLLUP_REVISION_LOOKBACK_MS = 30 * MS_PER_MINUTE
+
+# Правила слияния колонок агрегатов при укрупнении интервала
+ROLLUP_AGGREGATIONS = {
+    'opening_price_upbit': 'first',
+    'high_price_upbit': 'max',
+    'low_price_upbit': 'min',
+    'trade_price_upbit': 'last',
+    'volume_upbit': 'sum',
+    'opening_price_binance': 'first',
+    'high_price_binance': 'max',
+    'low_price_binance': 'min',
+    'close_price_binance': 'last',
+    'volume_binance': 'sum',
+    'premium_percent_min': 'min',
+    'premium_percent_max': 'max',
+    'premium_percent_sum': 'sum',
+    'premium_count': 'sum',
+    'candle_count': 'sum',
+}
+
+# Колонки и типы агрегатов в DataFrame и файлах
+ROLLUP_COLUMNS = ['market', 'bucket_start', *ROLLUP_AGGREGATIONS, 'premium_percent_mean']
+ROLLUP_DTYPES = {
+    'market': 'object',
+    'bucket_start': 'int64',
+    **{col: 'float64' for col in ROLLUP_AGGREGATIONS},
+    'premium_count': 'int64',
+    'candle_count': 'int64',
+    'premium_percent_mean': 'float64',
+}
+
+# Сколько закрытых интервалов копить словарями, прежде чем перевести их в DataFrame
+ROLLUP_CHUNK_ROWS = 10_000
+
 class DataValidationError(Exception):
     """Пользовательское исключение для ошибок валидации данных"""
     pass
 
+def to_epoch_ms(value: Union[int, str, datetime, pd.Timestamp]) -> int:
+    """Приведение момента времени к миллисекундам от эпохи"""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return pd.Timestamp(value).value // 1_000_000
+
+def to_duration_ms(value: Union[int, str, timedelta, pd.Timedelta]) -> int:
+    """Приведение длительности к миллисекундам; число или строка из цифр - уже мс"""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return pd.Timedelta(value) // pd.Timedelta(milliseconds=1)
+
+def load_candles(file_path: str, source: str) -> pd.DataFrame:
+    """Чтение файла свечей по схеме: только нужные колонки, явные типы, время в int64 мс
+
+    Фетчеры пишут время свечи колонкой candle_time_ms, и она читается как есть.
+    Строки времени разбираются только для файлов старого формата без этой колонки.
+    """
+    schema = CANDLE_SCHEMAS[source]
+
+    # Сопоставление нормализованных имен с исходными заголовками файла
+    header = pd.read_csv(file_path, nrows=0).columns
+    names = {col.strip().lower(): col for col in header}
+    dtypes = dict(schema['dtypes'])
+    if CANDLE_TIME_COLUMN in names:
+        dtypes[CANDLE_TIME_COLUMN] = 'int64'
+        time_column = None
+    else:
+        time_column = schema['time_column']
+    columns = [*dtypes, time_column] if time_column else list(dtypes)
+    missing = [col for col in columns if col not in names]
+    if missing:
+        raise DataValidationError(f"Missing columns {missing} in {source} data")
+
+    try:
+        df = pd.read_csv(
+            file_path,
+            usecols=[names[col] for col in columns],
+            dtype={names[col]: dtype for col, dtype in dtypes.items()},
+            engine='c'
+        )
+    except ValueError as e:
+        raise DataValidationError(f"Invalid values in {source} data: {e}")
+    df.columns = df.columns.str.strip().str.lower()
+    if df.empty:
+        raise DataValidationError(f"{source} data is empty")
+    if time_column is None:
+        return df
+
+    logger.info(f"No {CANDLE_TIME_COLUMN} column in {source} data, parsing {time_column}")
+    times = pd.to_datetime(df.pop(time_column), format=schema['time_format'], errors='coerce')
+    valid = times.notna()
+    if not valid.all():
+        logger.warning(f"Dropping {(~valid).sum()} rows with invalid dates in {source} data")
+        df = df[valid].copy()
+        times = times[valid]
+    df[CANDLE_TIME_COLUMN] = times.to_numpy(dtype='datetime64[ms]').astype('int64')
+    return df.reset_index(drop=True)
+
+def rollup_frame(rows: List[dict]) -> pd.DataFrame:
+    """Интервалы агрегатов (состояния с market и bucket_start) в виде DataFrame"""
+    frame = pd.DataFrame(rows, columns=ROLLUP_COLUMNS).astype(ROLLUP_DTYPES)
+    frame['premium_percent_mean'] = frame['premium_percent_sum'] / frame['premium_count']
+    return frame
+
+def rollup_paths(directory: str, level: str) -> tuple:
+    """Файлы уровня: закрытые интервалы (только дописываются) и незакрытый хвост"""
+    return os.path.join(directory, f"{level}.csv"), os.path.join(directory, f"{level}_open.csv")
+
+def revision_start(watermark: int) -> int:
+    """Начало окна пересчета агрегатов для рынка с последней учтенной свечой watermark"""
+    since = watermark - ROLLUP_REVISION_LOOKBACK_MS
+    return since - since % min(ROLLUP_LEVELS.values())
+
+def rollup_from_candles(data: pd.DataFrame) -> pd.DataFrame:
+    """Объединенные 5-минутные свечи в формате агрегатов"""
+    if data.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    raw = data.dropna(subset=['timestamp_upbit'])
+    premium = raw['premium_percent']
+    frame = raw[['market', 'opening_price_upbit', 'high_price_upbit', 'low_price_upbit',
+                 'trade_price_upbit', 'volume_upbit', 'opening_price_binance',
+                 'high_price_binance', 'low_price_binance', 'close_price_binance',
+                 'volume_binance']].copy()
+    frame['bucket_start'] = raw['timestamp_upbit']
+    frame['premium_percent_min'] = premium
+    frame['premium_percent_max'] = premium
+    frame['premium_percent_sum'] = premium.fillna(0.0)
+    frame['premium_count'] = premium.notna().astype(int)
+    frame['candle_count'] = 1
+    frame['premium_percent_mean'] = premium
+    return frame[ROLLUP_COLUMNS].sort_values(['market', 'bucket_start']).reset_index(drop=True)
+
+def select_rollup_level(resolution: int) -> str:
+    """Выбор самого крупного уровня, из которого можно получить нужное разрешение"""
+    if resolution < BASE_RESOLUTION_MS or resolution % BASE_RESOLUTION_MS != 0:
+        raise ValueError(f"Resolution must be a multiple of {BASE_RESOLUTION_MS} ms, got {resolution}")
+    selected = '5m'
+    for level, width in ROLLUP_LEVELS.items():
+        if width <= resolution and resolution % width == 0:
+            selected = level
+    return selected
+
+def resample_rollup(frame: pd.DataFrame, resolution: int) -> pd.DataFrame:
+    """Укрупнение агрегатов до заданного разрешения"""
+    frame = frame.sort_values(['market', 'bucket_start']).copy()
+    frame['bucket_start'] -= frame['bucket_start'] % resolution
+    resampled = frame.groupby(['market', 'bucket_start'], sort=True).agg(ROLLUP_AGGREGATIONS)
+    resampled = resampled.reset_index()
+    resampled['premium_percent_mean'] = resampled['premium_percent_sum'] / resampled['premium_count']
+    return resampled
+
+def slice_rollup(frame: pd.DataFrame, level: str, resolution: int,
+                 start: Optional[Union[int, datetime]] = None,
+                 end: Optional[Union[int, datetime]] = None,
+                 markets: Optional[List[str]] = None) -> pd.DataFrame:
+    """Отбор периода и рынков из агрегатов уровня с укрупнением до нужного разрешения"""
+    logger.debug(f"Serving {resolution} ms query from {level} level")
+    if markets is not None:
+        frame = frame[frame['market'].isin(markets)]
+    if start is not None:
+        start = to_epoch_ms(start)
+        frame = frame[frame['bucket_start'] >= start - start % resolution]
+    if end is not None:
+        frame = frame[frame['bucket_start'] <= to_epoch_ms(end)]
+
+    if frame.empty or resolution == ROLLUP_LEVELS.get(level, BASE_RESOLUTION_MS):
+        return frame.reset_index(drop=True)
+    return resample_rollup(frame, resolution)
+
+def query_saved_rollups(resolution: Union[int, str, pd.Timedelta] = BASE_RESOLUTION_MS,
+                        start: Optional[Union[int, datetime]] = None,
+                        end: Optional[Union[int, datetime]] = None,
+                        markets: Optional[List[str]] = None,
+                        directory: str = ROLLUP_DIRECTORY,
+                        combined_file: str = COMBINED_DATA_FILE) -> pd.DataFrame:
+    """То же, что DataCombiner.query_rollups, но по файлам save_rollups/save_combined_data
+
+    Для процессов, которые не ведут агрегаты сами: веб-сервера и ноутбука.
+    """
+    resolution = to_duration_ms(resolution)
+    level = select_rollup_level(resolution)
+    if level == '5m':
+        frame = rollup_from_candles(pd.read_csv(combined_file))
+    else:
+        closed_path, open_path = rollup_paths(directory, level)
+        frame = pd.concat([pd.read_csv(closed_path, dtype=ROLLUP_DTYPES),
+                           pd.read_csv(open_path, dtype=ROLLUP_DTYPES)], ignore_index=True)
+        # Интервал, закрытый между записью двух файлов, может оказаться в обоих
+        frame = frame.drop_duplicates(['market', 'bucket_start'], keep='last')
+        frame = frame.sort_values(['market', 'bucket_start']).reset_index(drop=True)
+    return slice_rollup(frame, level, resolution, start, end, markets)
+
 class DataCombiner:
     """Класс для объединения и обработки рыночных данных от Upbit и Binance"""
     
@@ -29,78 +270,30 @@ class DataCombiner:
         self.server_url = server_url
         self.raw_data = pd.DataFrame()
         self.processed_data = pd.DataFrame()
-        
-        # Требуемые столбцы для проверки
-        self.required_columns = {
-            'upbit': {
-                'market': str,
-                'candle_date_time_utc': str,
-                'opening_price': float,
-                'high_price': float,
-                'low_price': float,
-                'trade_price': float,
-                'candle_acc_trade_volume': float
-            },
-            'binance': {
-                'market': str,
-                'candle_date_time_utc': str,
-                'opening_price': float,
-                'high_price': float,
-                'low_price': float,
-                'close_price': float,
-                'volume': float
-            }
-        }
 
-    def _normalize_column_names(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Нормализация названий колонок"""
-        df.columns = df.columns.str.strip().str.lower()
-        return df
-
-    def _check_data_types(self, df: pd.DataFrame, source: str) -> None:
-        """Проверка типов данных в колонках"""
-        for col, expected_type in self.required_columns[source].items():
-            if col in df.columns:
-                if expected_type in (float, int):
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                elif expected_type == str:
-                    df[col] = df[col].astype(str)
-            else:
-                raise DataValidationError(f"Missing column {col} in {source} data")
-
-    def validate_input_data(self, df: pd.DataFrame, source: str) -> None:
-        """Расширенная валидация входных данных"""
-        logger.info(f"Validating {source} data")
-        if df.empty:
-            raise DataValidationError(f"{source} data is empty")
-        self._normalize_column_names(df)
-        self._check_data_types(df, source)
-
-    def _process_datetime(self, df: pd.DataFrame, datetime_column: str) -> pd.DataFrame:
-        """Преобразование временных меток"""
-        if datetime_column in df.columns:
-            df[datetime_column] = pd.to_datetime(df[datetime_column], errors='coerce')
-            invalid_dates = df[df[datetime_column].isnull()].index
-            if len(invalid_dates) > 0:
-                logger.warning(f"Found invalid dates in {datetime_column}")
-        return df
+        # Незакрытые интервалы агрегатов, которые еще пересчитываются:
+        # {уровень: {market: {начало интервала: состояние}}}
+        self.rollups: Dict[str, Dict[str, Dict[int, dict]]] = {level: {} for level in ROLLUP_LEVELS}
+        # Вклад уже закрытых интервалов предыдущего уровня в незакрытые интервалы уровня
+        self._closed_parts: Dict[str, Dict[str, Dict[int, dict]]] = {level: {} for level in ROLLUP_LEVELS}
+        # Закрытые интервалы по уровням: куски DataFrame, новые только дописываются
+        self._closed_rollups: Dict[str, List[pd.DataFrame]] = {level: [] for level in ROLLUP_LEVELS}
+        # Закрытые куски, еще не дописанные в файлы, и каталог, куда дописывать
+        self._unsaved_rollups: Dict[str, List[pd.DataFrame]] = {level: [] for level in ROLLUP_LEVELS}
+        self._rollup_directory: Optional[str] = None
+        # Время последней учтенной в агрегатах свечи по каждому рынку
+        self._rollup_watermarks: Dict[str, int] = {}
 
     def combine_data(self, upbit_file: str, binance_file: str) -> pd.DataFrame:
         """Объединение данных Upbit и Binance"""
         logger.info("Combining data...")
-        upbit_df = pd.read_csv(upbit_file)
-        binance_df = pd.read_csv(binance_file)
-
-        self.validate_input_data(upbit_df, 'upbit')
-        self.validate_input_data(binance_df, 'binance')
-
-        upbit_df = self._process_datetime(upbit_df, 'candle_date_time_utc')
-        binance_df = self._process_datetime(binance_df, 'candle_date_time_utc')
+        upbit_df = load_candles(upbit_file, 'upbit')
+        binance_df = load_candles(binance_file, 'binance')
 
         combined_data = []
 
-        upbit_grouped = upbit_df.groupby('market')
-        binance_grouped = binance_df.groupby('market')
+        upbit_grouped = upbit_df.groupby('market', observed=True)
+        binance_grouped = binance_df.groupby('market', observed=True)
 
         for market in upbit_grouped.groups.keys():
             if market in binance_grouped.groups:
@@ -108,21 +301,19 @@ class DataCombiner:
                 binance_market_data = binance_grouped.get_group(market)
 
                 for _, upbit_row in upbit_market_data.iterrows():
-                    upbit_time = upbit_row['candle_date_time_utc']
+                    upbit_time = int(upbit_row[CANDLE_TIME_COLUMN])
                     matching_binance = binance_market_data[
-                        (binance_market_data['candle_date_time_utc'] >= upbit_time - timedelta(minutes=2)) &
-                        (binance_market_data['candle_date_time_utc'] <= upbit_time + timedelta(minutes=2))
+                        (binance_market_data[CANDLE_TIME_COLUMN] >= upbit_time - CANDLE_MATCH_TOLERANCE_MS) &
+                        (binance_market_data[CANDLE_TIME_COLUMN] <= upbit_time + CANDLE_MATCH_TOLERANCE_MS)
                     ]
                     if not matching_binance.empty:
-                        matching_binance['time_diff'] = abs(
-                            matching_binance['candle_date_time_utc'] - upbit_time
-                        )
-                        closest_binance = matching_binance.loc[matching_binance['time_diff'].idxmin()]
+                        time_diff = (matching_binance[CANDLE_TIME_COLUMN] - upbit_time).abs()
+                        closest_binance = matching_binance.loc[time_diff.idxmin()]
 
                         combined_record = {
                             'market': market,
                             'timestamp_upbit': upbit_time,
-                            'timestamp_binance': closest_binance['candle_date_time_utc'],
+                            'timestamp_binance': int(closest_binance[CANDLE_TIME_COLUMN]),
                             'opening_price_upbit': upbit_row['opening_price'],
                             'high_price_upbit': upbit_row['high_price'],
                             'low_price_upbit': upbit_row['low_price'],
@@ -133,7 +324,7 @@ class DataCombiner:
                             'low_price_binance': closest_binance['low_price'],
                             'close_price_binance': closest_binance['close_price'],
                             'volume_binance': closest_binance['volume'],
-                            'time_difference_seconds': closest_binance['time_diff'].total_seconds()
+                            'time_difference_seconds': time_diff.min() / 1000
                         }
 
                         # Расчет дополнительных показателей
@@ -148,9 +339,203 @@ class DataCombiner:
 
         self.processed_data = pd.DataFrame(combined_data)
         logger.info(f"Combined {len(self.processed_data)} rows of data")
+        self.update_rollups(self.processed_data)
         return self.processed_data
 
-    def save_combined_data(self, output_file: str = "combined_market_data.csv") -> None:
+    def _candle_state(self, record: dict) -> dict:
+        """Состояние интервала агрегата, состоящего из одной свечи"""
+        upbit_time = record['timestamp_upbit']
+        premium = record['premium_percent']
+        has_premium = pd.notna(premium)
+        return {
+            'first_time': upbit_time,
+            'last_time': upbit_time,
+            'opening_price_upbit': record['opening_price_upbit'],
+            'high_price_upbit': record['high_price_upbit'],
+            'low_price_upbit': record['low_price_upbit'],
+            'trade_price_upbit': record['trade_price_upbit'],
+            'volume_upbit': record['volume_upbit'],
+            'opening_price_binance': record['opening_price_binance'],
+            'high_price_binance': record['high_price_binance'],
+            'low_price_binance': record['low_price_binance'],
+            'close_price_binance': record['close_price_binance'],
+            'volume_binance': record['volume_binance'],
+            'premium_percent_min': premium if has_premium else np.nan,
+            'premium_percent_max': premium if has_premium else np.nan,
+            'premium_percent_sum': premium if has_premium else 0.0,
+            'premium_count': int(has_premium),
+            'candle_count': 1
+        }
+
+    def _merge_rollup_state(self, buckets: Dict[int, dict], bucket_start: int, state: dict) -> None:
+        """Слияние свечи или интервала более мелкого уровня в интервал агрегата"""
+        bucket = buckets.get(bucket_start)
+        if bucket is None:
+            buckets[bucket_start] = dict(state)
+            return
+
+        # Цены открытия/закрытия берутся по времени свечи, а не по порядку поступления
+        if state['first_time'] < bucket['first_time']:
+            bucket['first_time'] = state['first_time']
+            bucket['opening_price_upbit'] = state['opening_price_upbit']
+            bucket['opening_price_binance'] = state['opening_price_binance']
+        if state['last_time'] > bucket['last_time']:
+            bucket['last_time'] = state['last_time']
+            bucket['trade_price_upbit'] = state['trade_price_upbit']
+            bucket['close_price_binance'] = state['close_price_binance']
+
+        bucket['high_price_upbit'] = max(bucket['high_price_upbit'], state['high_price_upbit'])
+        bucket['low_price_upbit'] = min(bucket['low_price_upbit'], state['low_price_upbit'])
+        bucket['high_price_binance'] = max(bucket['high_price_binance'], state['high_price_binance'])
+        bucket['low_price_binance'] = min(bucket['low_price_binance'], state['low_price_binance'])
+        bucket['volume_upbit'] += state['volume_upbit']
+        bucket['volume_binance'] += state['volume_binance']
+        bucket['candle_count'] += state['candle_count']
+
+        if state['premium_count']:
+            if bucket['premium_count'] == 0:
+                bucket['premium_percent_min'] = state['premium_percent_min']
+                bucket['premium_percent_max'] = state['premium_percent_max']
+            else:
+                bucket['premium_percent_min'] = min(bucket['premium_percent_min'], state['premium_percent_min'])
+                bucket['premium_percent_max'] = max(bucket['premium_percent_max'], state['premium_percent_max'])
+            bucket['premium_percent_sum'] += state['premium_percent_sum']
+            bucket['premium_count'] += state['premium_count']
+
+    def _close_rollups(self, market: str, since: int, closed: Dict[str, List[dict]]) -> None:
+        """Перенос интервалов рынка, которые пересчет больше не затронет, в закрытые
+
+        Интервал закрыт, если целиком лежит до окна пересчета. Если интервал
+        следующего уровня, в который он входит, еще открыт, вклад закрытого
+        интервала запоминается в _closed_parts и участвует в его пересборке.
+        """
+        levels = list(ROLLUP_LEVELS.items())
+        for index, (level, width) in enumerate(levels):
+            level_since = since - since % width
+            buckets = self.rollups[level].get(market, {})
+            for bucket_start in [start for start in buckets if start < level_since]:
+                state = buckets.pop(bucket_start)
+                closed[level].append({'market': market, 'bucket_start': bucket_start, **state})
+                if index + 1 < len(levels):
+                    parent, parent_width = levels[index + 1]
+                    parent_start = bucket_start - bucket_start % parent_width
+                    if parent_start >= since - since % parent_width:
+                        parts = self._closed_parts[parent].setdefault(market, {})
+                        self._merge_rollup_state(parts, parent_start, state)
+
+            parts = self._closed_parts[level].get(market, {})
+            for bucket_start in [start for start in parts if start < level_since]:
+                del parts[bucket_start]
+
+    def update_rollups(self, data: pd.DataFrame) -> int:
+        """Инкрементальное обновление агрегатов новыми и пересмотренными свечами
+
+        Последняя свеча может быть еще не закрыта, а Binance каждый цикл перезагружает
+        последние сутки, поэтому свечи за ROLLUP_REVISION_LOOKBACK_MS до уже учтенной
+        берутся повторно. Незакрытые интервалы пересобираются: 15m - из свечей,
+        каждый следующий уровень - из незакрытых интервалов предыдущего и вклада
+        закрытых. Интервалы до окна пересчета закрываются и дописываются в DataFrame.
+        """
+        if data.empty:
+            return 0
+
+        rolled = 0
+        closed = {level: [] for level in ROLLUP_LEVELS}
+        chunks = {level: [] for level in ROLLUP_LEVELS}
+        data = data.dropna(subset=['timestamp_upbit'])
+        for market, market_data in data.groupby('market'):
+            watermark = self._rollup_watermarks.get(market)
+            if watermark is not None:
+                market_data = market_data[market_data['timestamp_upbit'] >= revision_start(watermark)]
+            if market_data.empty:
+                continue
+
+            market_data = market_data.sort_values('timestamp_upbit')
+            source = [(record['timestamp_upbit'], self._candle_state(record))
+                      for record in market_data.to_dict('records')]
+            for level, width in ROLLUP_LEVELS.items():
+                # Все незакрытые интервалы лежат в окне пересчета и собираются заново
+                buckets = {start: dict(state)
+                           for start, state in self._closed_parts[level].get(market, {}).items()}
+                for state_start, state in source:
+                    self._merge_rollup_state(buckets, state_start - state_start % width, state)
+                self.rollups[level][market] = buckets
+                source = list(buckets.items())
+
+            latest = int(market_data['timestamp_upbit'].iloc[-1])
+            watermark = latest if watermark is None else max(watermark, latest)
+            self._rollup_watermarks[market] = watermark
+            self._close_rollups(market, revision_start(watermark), closed)
+            rolled += len(market_data)
+
+            for level, rows in closed.items():
+                if len(rows) >= ROLLUP_CHUNK_ROWS:
+                    chunks[level].append(rollup_frame(rows))
+                    rows.clear()
+
+        for level, rows in closed.items():
+            if rows:
+                chunks[level].append(rollup_frame(rows))
+            if chunks[level]:
+                chunk = pd.concat(chunks[level], ignore_index=True)
+                self._closed_rollups[level].append(chunk)
+                self._unsaved_rollups[level].append(chunk)
+        logger.info(f"Rolled up {rolled} new or revised candles into {len(ROLLUP_LEVELS)} levels")
+        return rolled
+
+    def _open_rollup(self, level: str) -> pd.DataFrame:
+        """Незакрытые интервалы уровня в виде DataFrame"""
+        return rollup_frame([{'market': market, 'bucket_start': bucket_start, **state}
+                             for market, buckets in self.rollups[level].items()
+                             for bucket_start, state in buckets.items()])
+
+    def get_rollup(self, level: str) -> pd.DataFrame:
+        """Агрегаты уровня в виде DataFrame: закрытые интервалы и незакрытый хвост"""
+        if level not in ROLLUP_LEVELS:
+            raise ValueError(f"Unknown rollup level {level}")
+
+        closed = self._closed_rollups[level]
+        if len(closed) > 1:
+            closed[:] = [pd.concat(closed, ignore_index=True)]
+        frame = pd.concat([*closed, self._open_rollup(level)], ignore_index=True)
+        return frame.sort_values(['market', 'bucket_start']).reset_index(drop=True)
+
+    def query_rollups(self, resolution: Union[int, str, pd.Timedelta] = BASE_RESOLUTION_MS,
+                      start: Optional[Union[int, datetime]] = None,
+                      end: Optional[Union[int, datetime]] = None,
+                      markets: Optional[List[str]] = None) -> pd.DataFrame:
+        """Выборка данных за период с нужным разрешением из самого крупного подходящего уровня
+
+        Разрешение задается в мс или строкой ('1h', '30min'), границы периода - в мс
+        от эпохи или любым значением, понятным pd.Timestamp.
+        """
+        resolution = to_duration_ms(resolution)
+        level = select_rollup_level(resolution)
+        frame = rollup_from_candles(self.processed_data) if level == '5m' else self.get_rollup(level)
+        return slice_rollup(frame, level, resolution, start, end, markets)
+
+    def save_rollups(self, directory: str = ROLLUP_DIRECTORY) -> None:
+        """Сохранение агрегатов по уровням для дашборда и ноутбука
+
+        Закрытые интервалы дописываются в конец файла уровня, целиком файл пишется
+        только при первом сохранении в каталог. Незакрытый хвост перезаписывается.
+        """
+        os.makedirs(directory, exist_ok=True)
+        append = self._rollup_directory == directory
+        for level in ROLLUP_LEVELS:
+            closed_path, open_path = rollup_paths(directory, level)
+            chunks = self._unsaved_rollups[level] if append else self._closed_rollups[level]
+            if chunks:
+                pd.concat(chunks, ignore_index=True).to_csv(
+                    closed_path, mode='a' if append else 'w', header=not append, index=False)
+            elif not append:
+                rollup_frame([]).to_csv(closed_path, index=False)
+            self._unsaved_rollups[level] = []
+            self._open_rollup(level).to_csv(open_path, index=False)
+        self._rollup_directory = directory
+        logger.info(f"Rollups saved to {directory}")
+
+    def save_combined_data(self, output_file: str = COMBINED_DATA_FILE) -> None:
         """Сохранение объединенных данных"""
         if self.processed_data.empty:
             logger.error("No data to save")
@@ -166,6 +551,7 @@ def main():
     combined_data = combiner.combine_data(upbit_file, binance_file)
     if not combined_data.empty:
         combiner.save_combined_data()
+        combiner.save_rollups()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
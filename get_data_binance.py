@@ -5,9 +5,9 @@ from datetime import datetime, timezone, timedelta
 import time
 
 class BinanceDataFetcher:
-    def __init__(self):
-        self.base_url_spot = "https://api.binance.com/api/v3/klines"
-        self.base_url_perp = "https://fapi.binance.com/fapi/v1/klines"
+    def __init__(self, spot_url="https://api.binance.com", futures_url="https://fapi.binance.com"):
+        self.base_url_spot = f"{spot_url}/api/v3/klines"
+        self.base_url_perp = f"{futures_url}/fapi/v1/klines"
         self.all_pairs_data = []
         # Rate limiting parameters
         self.request_window = 1.0  # 1 second window
@@ -98,7 +98,7 @@ class BinanceDataFetcher:
                     for candle in spot_data:
                         processed_candle = {
                             "market": pair,
-                            "candle_date_time_utc": datetime.fromtimestamp(candle[0]/1000).strftime('%Y-%m-%d %H:%M:%S'),
+                            "candle_time_ms": candle[0],
                             "opening_price": float(candle[1]),
                             "high_price": float(candle[2]),
                             "low_price": float(candle[3]),
@@ -113,7 +113,7 @@ class BinanceDataFetcher:
                     for candle in perp_data:
                         processed_candle = {
                             "market": pair,
-                            "candle_date_time_utc": datetime.fromtimestamp(candle[0]/1000).strftime('%Y-%m-%d %H:%M:%S'),
+                            "candle_time_ms": candle[0],
                             "opening_price": float(candle[1]),
                             "high_price": float(candle[2]),
                             "low_price": float(candle[3]),
@@ -149,6 +149,21 @@ class BinanceDataFetcher:
 
             return [r for r in results if r is not None]
 
+    @staticmethod
+    def _local_time_to_ms(times):
+        """Epoch ms for the host-local time strings the old file format stored
+
+        They were written with datetime.fromtimestamp, so they are parsed back in
+        the host timezone, DST included. Wall times repeated by a DST fall-back
+        cannot be told apart and come back as NaN.
+        """
+        def to_ms(value):
+            moment = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+            first, second = moment.timestamp(), moment.replace(fold=1).timestamp()
+            return int(first * 1000) if first == second else None
+
+        return times.map({value: to_ms(value) for value in times.unique()})
+
     def save_to_csv(self):
         """Save the collected data to CSV"""
         if self.all_pairs_data:
@@ -156,12 +171,19 @@ class BinanceDataFetcher:
             
             try:
                 existing_df = pd.read_csv("binance_historical_data.csv")
+                if 'candle_time_ms' not in existing_df.columns:
+                    # Old file format: candle time only as a host-local time string
+                    times = self._local_time_to_ms(existing_df.pop('candle_date_time_utc'))
+                    if times.isna().any():
+                        print(f"Dropping {times.isna().sum()} old records with ambiguous local times")
+                    existing_df = existing_df[times.notna()].copy()
+                    existing_df['candle_time_ms'] = times.dropna().astype('int64')
                 combined_df = pd.concat([existing_df, df])
                 combined_df = combined_df.drop_duplicates(
-                    subset=['market', 'candle_date_time_utc', 'market_type'],
+                    subset=['market', 'candle_time_ms', 'market_type'],
                     keep='last'
                 )
-                combined_df = combined_df.sort_values(['market', 'candle_date_time_utc'])
+                combined_df = combined_df.sort_values(['market', 'candle_time_ms'])
                 combined_df.to_csv("binance_historical_data.csv", index=False)
                 print(f"Updated data saved: {len(combined_df)} records")
                 
@@ -4,23 +4,32 @@ import pandas as pd
 from datetime import datetime, timezone, timedelta
 import pytz
 
+CANDLE_INTERVAL_MS = 5 * 60 * 1000
+
 class UpbitDataFetcher:
-    def __init__(self, batch_size=200, delay=1):
-        self.base_url = "https://api.upbit.com/v1/candles/minutes/5"
+    def __init__(self, batch_size=200, delay=1, api_url="https://api.upbit.com", request_delay=0.2):
+        self.api_url = api_url
+        self.base_url = f"{api_url}/v1/candles/minutes/5"
         self.headers = {"accept": "application/json"}
         self.shit_list = ['KRW-USDT']  # Pairs to exclude
         self.filtered_pairs = []
         self.all_candles_data = []
         self.batch_size = batch_size
         self.delay = delay
+        self.request_delay = request_delay  # Pause between history requests
         self.krw_usdt_rate = None
         self.is_first_run = True
 
+    @staticmethod
+    def _candle_time_ms(candle):
+        """Candle open time in epoch ms, from the last tick time inside the candle"""
+        return candle['timestamp'] - candle['timestamp'] % CANDLE_INTERVAL_MS
+
     async def fetch_market_pairs(self):
         """Fetch and filter market pairs from Upbit"""
         try:
             async with aiohttp.ClientSession() as session:
-                async with session.get("https://api.upbit.com/v1/market/all") as response:
+                async with session.get(f"{self.api_url}/v1/market/all") as response:
                     response.raise_for_status()
                     markets = await response.json()
                     self.filtered_pairs = [market['market'] for market in markets 
@@ -34,7 +43,7 @@ class UpbitDataFetcher:
     async def fetch_krw_usdt_rate(self, session):
         """Fetch KRW-USDT exchange rate"""
         try:
-            url = "https://api.upbit.com/v1/ticker"
+            url = f"{self.api_url}/v1/ticker"
             params = {'markets': 'KRW-USDT'}
             async with session.get(url, params=params, headers=self.headers) as response:
                 response.raise_for_status()
@@ -87,13 +96,13 @@ class UpbitDataFetcher:
                             'trade_price': float(candle['trade_price']) / self.krw_usdt_rate,
                             'candle_acc_trade_volume': float(candle['candle_acc_trade_volume']),
                             'candle_acc_trade_price': float(candle['candle_acc_trade_price']) / self.krw_usdt_rate,
-                            'timestamp': pd.to_datetime(candle['candle_date_time_utc'])
+                            'candle_time_ms': self._candle_time_ms(candle)
                         }
                         all_candles.append(processed_candle)
                     
                     current_date = datetime.strptime(candles[-1]['candle_date_time_utc'], 
                                                    '%Y-%m-%dT%H:%M:%S')
-                    await asyncio.sleep(0.2)  # Rate limiting
+                    await asyncio.sleep(self.request_delay)  # Rate limiting
                     
             except Exception as e:
                 print(f"  ├── Error in batch {batch_count} for {pair}: {e}")
@@ -123,7 +132,7 @@ class UpbitDataFetcher:
                                 'trade_price': float(candle['trade_price']) / self.krw_usdt_rate,
                                 'candle_acc_trade_volume': float(candle['candle_acc_trade_volume']),
                                 'candle_acc_trade_price': float(candle['candle_acc_trade_price']) / self.krw_usdt_rate,
-                                'timestamp': pd.to_datetime(candle['candle_date_time_utc'])
+                                'candle_time_ms': self._candle_time_ms(candle)
                             }
                             self.all_candles_data.append(processed_candle)
             except Exception as e:
@@ -168,20 +177,25 @@ class UpbitDataFetcher:
         
         try:
             existing_df = pd.read_csv("upbit_data.csv")
-            existing_df['timestamp'] = pd.to_datetime(existing_df['timestamp'])
+            if 'candle_time_ms' not in existing_df.columns:
+                # Old file format: candle time only as a string
+                existing_df['candle_time_ms'] = pd.to_datetime(
+                    existing_df['candle_date_time_utc']
+                ).to_numpy(dtype='datetime64[ms]').astype('int64')
+                existing_df = existing_df.drop(columns='timestamp', errors='ignore')
             
             combined_df = pd.concat([existing_df, new_df])
             combined_df = combined_df.drop_duplicates(
-                subset=['market', 'timestamp'], 
+                subset=['market', 'candle_time_ms'], 
                 keep='last'
             )
             
-            combined_df = combined_df.sort_values(['market', 'timestamp'])
+            combined_df = combined_df.sort_values(['market', 'candle_time_ms'])
             combined_df.to_csv("upbit_data.csv", index=False)
             print(f"Updated upbit_data.csv with {len(combined_df)} records")
             
         except FileNotFoundError:
-            new_df = new_df.sort_values(['market', 'timestamp'])
+            new_df = new_df.sort_values(['market', 'candle_time_ms'])
             new_df.to_csv("upbit_data.csv", index=False)
             print(f"Created upbit_data.csv with {len(new_df)} records")
 
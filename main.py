@@ -37,8 +37,9 @@ async def main():
                # print(binance_fetcher.all_pairs_data)
 
                 # Обработка и комбинирование данных
-                data_combiner.combine_data('/Users/user/Desktop/upbit vs binance/upbit_data.csv', '/Users/user/Desktop/upbit vs binance/binance_historical_data.csv')
+                data_combiner.combine_data('upbit_data.csv', 'binance_historical_data.csv')
                 data_combiner.save_combined_data()
+                data_combiner.save_rollups()
                 await data_combiner.send_to_web_service()
                 
                 print("\n=== Data Collection Cycle Completed ===")
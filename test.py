@@ -10,8 +10,8 @@ async def main():
     # Комбинирование данных
     print("Combining data...")
     data_combiner.combine_data(
-        '/Users/user/Desktop/upbit vs binance/upbit_data.csv', 
-        '/Users/user/Desktop/upbit vs binance/binance_historical_data.csv'
+        'upbit_data.csv', 
+        'binance_historical_data.csv'
     )
     data_combiner.save_combined_data()
 
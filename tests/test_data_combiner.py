@@ -0,0 +1,165 @@
+import importlib
+
+import pandas as pd
+import pytest
+
+UPBIT_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+BINANCE_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+@pytest.fixture
+def data_combiner(tmp_path, monkeypatch):
+    # Модуль при импорте открывает data_combiner.log в текущем каталоге
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module('data_combiner')
+
+def write_candles(tmp_path, times, binance_closes):
+    upbit = pd.DataFrame({
+        'market': 'BTC/USDT',
+        'candle_date_time_utc': times.strftime(UPBIT_TIME_FORMAT),
+        'opening_price': 100.0,
+        'high_price': 101.0,
+        'low_price': 99.0,
+        'trade_price': 100.0,
+        'candle_acc_trade_volume': 1.0
+    })
+    binance = pd.DataFrame({
+        'market': 'BTC/USDT',
+        'candle_date_time_utc': times.strftime(BINANCE_TIME_FORMAT),
+        'opening_price': 100.0,
+        'high_price': 101.0,
+        'low_price': 89.0,
+        'close_price': binance_closes,
+        'volume': 2.0
+    })
+    upbit.to_csv(tmp_path / 'upbit.csv', index=False)
+    binance.to_csv(tmp_path / 'binance.csv', index=False)
+
+def test_rollups_follow_revised_candle(data_combiner, tmp_path):
+    times = pd.date_range('2024-11-30 14:00', periods=3, freq='5min')
+    combiner = data_combiner.DataCombiner()
+
+    write_candles(tmp_path, times, [100.0, 100.0, 100.0])
+    combiner.combine_data(tmp_path / 'upbit.csv', tmp_path / 'binance.csv')
+
+    # Последняя свеча Binance была незакрытой и пришла заново с другой ценой
+    write_candles(tmp_path, times, [100.0, 100.0, 90.0])
+    combiner.combine_data(tmp_path / 'upbit.csv', tmp_path / 'binance.csv')
+
+    expected = combiner.query_rollups('5min').iloc[-1]
+    for resolution in ('15min', '1h', '4h', '1D'):
+        rollup = combiner.query_rollups(resolution)
+        assert len(rollup) == 1
+        assert rollup['close_price_binance'].iloc[0] == expected['close_price_binance'] == 90.0
+        assert rollup['premium_percent_max'].iloc[0] == pytest.approx(expected['premium_percent_max'])
+        assert rollup['candle_count'].iloc[0] == 3
+
+def test_incremental_rollups_match_full_rebuild(data_combiner, tmp_path):
+    times = pd.date_range('2024-11-30 22:00', periods=48, freq='5min')
+    closes = [100.0 + i % 7 for i in range(len(times))]
+    incremental = data_combiner.DataCombiner()
+    for end in (10, 30, len(times)):
+        write_candles(tmp_path, times[:end], closes[:end])
+        incremental.combine_data(tmp_path / 'upbit.csv', tmp_path / 'binance.csv')
+
+    full = data_combiner.DataCombiner()
+    full.combine_data(tmp_path / 'upbit.csv', tmp_path / 'binance.csv')
+    for level in data_combiner.ROLLUP_LEVELS:
+        pd.testing.assert_frame_equal(incremental.get_rollup(level), full.get_rollup(level))
+
+def test_saved_rollups_match_in_process_queries(data_combiner, tmp_path):
+    times = pd.date_range('2024-11-30 22:00', periods=48, freq='5min')
+    write_candles(tmp_path, times, [100.0 + i % 5 for i in range(len(times))])
+    combiner = data_combiner.DataCombiner()
+    combiner.combine_data(tmp_path / 'upbit.csv', tmp_path / 'binance.csv')
+    combiner.save_combined_data()
+    combiner.save_rollups()
+
+    for resolution in ('5min', '30min', '1h', '2h'):
+        pd.testing.assert_frame_equal(
+            data_combiner.query_saved_rollups(resolution, start='2024-11-30 23:00'),
+            combiner.query_rollups(resolution, start='2024-11-30 23:00'),
+            check_dtype=False
+        )
+
+def test_load_candles_reads_epoch_ms_column(data_combiner, tmp_path):
+    path = tmp_path / 'binance.csv'
+    pd.DataFrame({
+        'market': ['BTC/USDT', 'ETH/USDT'],
+        'candle_time_ms': [1732975200000, 1732975500000],
+        'opening_price': [1.0, 2.0],
+        'high_price': [1.0, 2.0],
+        'low_price': [1.0, 2.0],
+        'close_price': [1.0, 2.0],
+        'volume': [1.0, 2.0],
+        'market_type': 'spot'
+    }).to_csv(path, index=False)
+
+    candles = data_combiner.load_candles(path, 'binance')
+    assert candles['candle_time_ms'].dtype == 'int64'
+    assert candles['candle_time_ms'].tolist() == [1732975200000, 1732975500000]
+    assert isinstance(candles['market'].dtype, pd.CategoricalDtype)
+    assert 'market_type' not in candles.columns
+
+def combined_candles(times, markets=('BTC/USDT', 'ETH/USDT')):
+    """Объединенные свечи в формате combine_data"""
+    frames = []
+    for offset, market in enumerate(markets):
+        closes = [100.0 + offset + i % 11 for i in range(len(times))]
+        frames.append(pd.DataFrame({
+            'market': market,
+            'timestamp_upbit': (times - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1),
+            'opening_price_upbit': closes,
+            'high_price_upbit': [close + 1 for close in closes],
+            'low_price_upbit': [close - 1 for close in closes],
+            'trade_price_upbit': closes,
+            'volume_upbit': 1.0,
+            'opening_price_binance': closes,
+            'high_price_binance': closes,
+            'low_price_binance': closes,
+            'close_price_binance': 100.0,
+            'volume_binance': 2.0,
+            'premium_percent': [close - 100.0 for close in closes]
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+def test_closed_rollups_leave_only_revisable_tail(data_combiner):
+    times = pd.date_range('2024-11-30 20:00', periods=30 * 12, freq='5min')
+    data = combined_candles(times)
+    incremental = data_combiner.DataCombiner()
+    for end in range(1, len(times) + 1):
+        incremental.update_rollups(data[data['timestamp_upbit'] <= data['timestamp_upbit'].iloc[end - 1]])
+
+    full = data_combiner.DataCombiner()
+    full.update_rollups(data)
+    for level in data_combiner.ROLLUP_LEVELS:
+        pd.testing.assert_frame_equal(incremental.get_rollup(level), full.get_rollup(level))
+        # Словарями хранится только окно пересчета, остальное - в DataFrame
+        for combiner in (incremental, full):
+            assert all(len(buckets) <= 3 for buckets in combiner.rollups[level].values())
+    # 30 часов с 20:00 задевают три дня по каждому из двух рынков
+    assert len(full.get_rollup('1d')) == 6
+
+def test_save_rollups_appends_closed_buckets(data_combiner, tmp_path):
+    times = pd.date_range('2024-11-30 20:00', periods=8 * 12, freq='5min')
+    data = combined_candles(times)
+    combiner = data_combiner.DataCombiner()
+    closed_path, _ = data_combiner.rollup_paths('rollups', '15m')
+
+    saved = []
+    for end in (48, 72, 96):
+        combiner.update_rollups(data[data['timestamp_upbit'] <= data['timestamp_upbit'].iloc[end - 1]])
+        combiner.save_rollups()
+        saved.append(open(closed_path).read())
+        for resolution in ('15min', '1h', '1D'):
+            pd.testing.assert_frame_equal(data_combiner.query_saved_rollups(resolution),
+                                          combiner.query_rollups(resolution))
+
+    # Закрытые интервалы только дописываются в конец файла
+    assert saved[0] and saved[1].startswith(saved[0]) and saved[2].startswith(saved[1])
+    assert len(saved[2]) > len(saved[1]) > len(saved[0])
+
+    # Новый процесс переписывает файл целиком, не дублируя уже сохраненное
+    restarted = data_combiner.DataCombiner()
+    restarted.update_rollups(data)
+    restarted.save_rollups()
+    pd.testing.assert_frame_equal(data_combiner.query_saved_rollups('15min'), combiner.query_rollups('15min'))
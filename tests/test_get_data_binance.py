@@ -0,0 +1,54 @@
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+from get_data_binance import BinanceDataFetcher
+
+CANDLE_INTERVAL_MS = 5 * 60 * 1000
+
+@pytest.fixture
+def new_york(monkeypatch):
+    # Старый формат писал время в часовом поясе машины
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def kline_record(open_ms, close):
+    return {
+        'market': 'BTC/USDT',
+        'candle_time_ms': open_ms,
+        'opening_price': close,
+        'high_price': close,
+        'low_price': close,
+        'close_price': close,
+        'volume': 1.0,
+        'quote_volume': 1.0,
+        'market_type': 'spot'
+    }
+
+def test_old_file_times_are_read_in_host_timezone(new_york, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # 2024-11-03 03:00-08:00 UTC: в Нью-Йорке 01:00-01:55 проходит дважды (EDT, затем EST)
+    start_ms = int(datetime(2024, 11, 3, 3, tzinfo=timezone.utc).timestamp() * 1000)
+    open_times = [start_ms + i * CANDLE_INTERVAL_MS for i in range(60)]
+    old = pd.DataFrame([kline_record(open_ms, 1.0) for open_ms in open_times])
+    old.insert(1, 'candle_date_time_utc', [
+        datetime.fromtimestamp(open_ms / 1000).strftime('%Y-%m-%d %H:%M:%S') for open_ms in open_times
+    ])
+    old.drop(columns='candle_time_ms').to_csv('binance_historical_data.csv', index=False)
+
+    fetcher = BinanceDataFetcher()
+    fetcher.all_pairs_data = [kline_record(open_ms, 2.0) for open_ms in open_times[-6:]]
+    fetcher.save_to_csv()
+
+    saved = pd.read_csv('binance_historical_data.csv')
+    assert saved['candle_time_ms'].is_unique
+    assert set(saved['candle_time_ms']) <= set(open_times)
+    # Свежие свечи заменили старые с тем же временем, а не добавились рядом
+    assert saved.loc[saved['candle_time_ms'].isin(open_times[-6:]), 'close_price'].eq(2.0).all()
+    # Неоднозначные 01:00-01:55 (24 записи из 12 строк времени) отброшены
+    assert len(saved) == len(open_times) - 24
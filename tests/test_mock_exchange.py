@@ -0,0 +1,154 @@
+import asyncio
+from datetime import datetime, timezone
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from benchmarks.mock_exchange import CANDLE_INTERVAL_MS, MockExchange
+
+# 2024-11-30 14:00 UTC
+END_MS = 1732975200000
+
+def with_client(exchange, scenario):
+    """Запуск scenario(client) против приложения биржи без сетевого порта"""
+    async def run():
+        async with TestClient(TestServer(exchange._build_app())) as client:
+            return await scenario(client)
+    return asyncio.run(run())
+
+async def get_json(client, path, **params):
+    async with client.get(path, params=params) as response:
+        return response.status, await response.json()
+
+def test_recorded_fixtures_are_shifted_to_now(tmp_path):
+    path = tmp_path / 'fixtures.json'
+    recorded_end = int(datetime(2024, 11, 30, 14, tzinfo=timezone.utc).timestamp() * 1000)
+    MockExchange(markets=2).dump_fixtures(path, recorded_end, hours=30)
+
+    exchange = MockExchange(fixtures=path)
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+    current_open_ms = now_ms - now_ms % CANDLE_INTERVAL_MS
+
+    assert exchange.markets == ['KRW-C0000', 'KRW-C0001']
+    upbit = exchange.recorded['upbit']['KRW-C0000']
+    newest_upbit = datetime.fromisoformat(upbit[0]['candle_date_time_utc']).replace(tzinfo=timezone.utc)
+    assert int(newest_upbit.timestamp() * 1000) in (current_open_ms, current_open_ms - CANDLE_INTERVAL_MS)
+    assert upbit[0]['timestamp'] == int(newest_upbit.timestamp() * 1000) + CANDLE_INTERVAL_MS - 1
+
+    klines = exchange.recorded['binance']['C0000USDT']
+    assert klines[-1][0] == int(newest_upbit.timestamp() * 1000)
+    assert klines[-1][6] == klines[-1][0] + CANDLE_INTERVAL_MS - 1
+    assert len(klines) == len(upbit) == 30 * 12
+
+def test_faults_follow_ratios_and_rate_limits_carry_retry_after():
+    exchange = MockExchange(markets=1, rate_limit_ratio=0.3, error_ratio=0.2, seed=1)
+
+    async def scenario(client):
+        responses = []
+        for _ in range(1000):
+            async with client.get('/v1/market/all') as response:
+                responses.append((response.status, response.headers.get('Retry-After')))
+        return responses
+
+    responses = with_client(exchange, scenario)
+    statuses = [status for status, _ in responses]
+    assert 250 <= statuses.count(429) <= 350
+    assert 150 <= statuses.count(500) <= 250
+    assert statuses.count(200) == 1000 - statuses.count(429) - statuses.count(500)
+    assert {retry_after for status, retry_after in responses if status == 429} == {'1'}
+    assert {retry_after for status, retry_after in responses if status != 429} == {None}
+
+def test_request_summary_counts_by_status_and_path():
+    exchange = MockExchange(markets=2)
+
+    async def scenario(client):
+        await get_json(client, '/v1/market/all')
+        await get_json(client, '/v1/candles/minutes/5', market='KRW-C0000', count=2)
+        await get_json(client, '/v1/candles/minutes/5', market='KRW-NOPE')
+        await get_json(client, '/api/v3/klines', symbol='C0001USDT', limit=2)
+        _, stats = await get_json(client, '/_mock/stats')
+        async with client.post('/_mock/reset'):
+            pass
+        _, after_reset = await get_json(client, '/_mock/stats')
+        return stats, after_reset
+
+    stats, after_reset = with_client(exchange, scenario)
+    # Служебные /_mock/ не считаются
+    assert stats == {
+        'markets': 2,
+        'requests': {
+            'total': 4,
+            'by_status': {'200': 3, '404': 1},
+            'by_path': {'/api/v3/klines': 1, '/v1/candles/minutes/5': 2, '/v1/market/all': 1}
+        }
+    }
+    assert after_reset['requests'] == {'total': 0, 'by_status': {}, 'by_path': {}}
+    assert exchange.request_summary()['total'] == 0
+
+def test_upbit_candles_end_before_to_and_respect_count():
+    exchange = MockExchange(markets=1)
+
+    async def scenario(client):
+        return (
+            await get_json(client, '/v1/candles/minutes/5', market='KRW-C0000', count=3,
+                           to='2024-11-30T14:00:00'),
+            await get_json(client, '/v1/candles/minutes/5', market='KRW-C0000', count=500,
+                           to='2024-11-30 14:02:00'),
+            await get_json(client, '/v1/candles/minutes/5', market='KRW-C0000')
+        )
+
+    (status, candles), (_, capped), (_, latest) = with_client(exchange, scenario)
+    assert status == 200
+    # Свеча, открытая ровно в to, не отдается; порядок - от новых к старым
+    assert [candle['candle_date_time_utc'] for candle in candles] == [
+        '2024-11-30T13:55:00', '2024-11-30T13:50:00', '2024-11-30T13:45:00'
+    ]
+    assert len(capped) == 200
+    assert capped[0]['candle_date_time_utc'] == '2024-11-30T14:00:00'
+    assert len(latest) == 1
+
+def test_recorded_upbit_candles_end_before_to(tmp_path):
+    path = tmp_path / 'fixtures.json'
+    MockExchange(markets=1).dump_fixtures(path, END_MS, hours=30)
+    exchange = MockExchange(fixtures=path)
+    recorded = exchange.recorded['upbit']['KRW-C0000']
+    to = recorded[5]['candle_date_time_utc']
+
+    status, candles = with_client(exchange, lambda client: get_json(
+        client, '/v1/candles/minutes/5', market='KRW-C0000', count=4, to=to))
+    assert status == 200
+    assert candles == recorded[6:10]
+
+def test_klines_cover_start_to_end_inclusive_up_to_limit():
+    exchange = MockExchange(markets=1)
+    start_ms = END_MS - 12 * CANDLE_INTERVAL_MS
+
+    async def scenario(client):
+        return (
+            await get_json(client, '/api/v3/klines', symbol='C0000USDT',
+                           startTime=start_ms, endTime=start_ms + 4 * CANDLE_INTERVAL_MS),
+            await get_json(client, '/fapi/v1/klines', symbol='C0000USDT', limit=3,
+                           startTime=start_ms + 1, endTime=END_MS),
+            await get_json(client, '/api/v3/klines', symbol='C0000USDT', limit=5000,
+                           startTime=END_MS - 2000 * CANDLE_INTERVAL_MS, endTime=END_MS),
+            await get_json(client, '/api/v3/klines', symbol='NOPEUSDT')
+        )
+
+    (status, window), (_, limited), (_, capped), (unknown, _) = with_client(exchange, scenario)
+    assert status == 200
+    assert [kline[0] for kline in window] == [start_ms + i * CANDLE_INTERVAL_MS for i in range(5)]
+    # Начало между свечами округляется вверх; отдаются первые limit свечей по возрастанию
+    assert [kline[0] for kline in limited] == [start_ms + i * CANDLE_INTERVAL_MS for i in range(1, 4)]
+    assert len(capped) == 1000
+    assert unknown == 400
+
+def test_recorded_klines_cover_start_to_end_inclusive(tmp_path):
+    path = tmp_path / 'fixtures.json'
+    MockExchange(markets=1).dump_fixtures(path, END_MS, hours=30)
+    exchange = MockExchange(fixtures=path)
+    recorded = exchange.recorded['binance']['C0000USDT']
+
+    status, klines = with_client(exchange, lambda client: get_json(
+        client, '/api/v3/klines', symbol='C0000USDT', limit=3,
+        startTime=recorded[10][0], endTime=recorded[20][0]))
+    assert status == 200
+    assert klines == recorded[10:13]
@@ -0,0 +1,31 @@
+from benchmarks.pipeline import find_regressions
+
+OPTIONS = {'cycles': 1, 'latency': 0.0, 'exchange': 'subprocess'}
+
+def entry(cycle_seconds, peak_rss_mb=100.0, host='bench', options=OPTIONS, scale='150'):
+    return {
+        'host': host,
+        'options': options,
+        'results': {scale: [{'cycle': 0, 'cycle_seconds': cycle_seconds, 'peak_rss_mb': peak_rss_mb}]}
+    }
+
+def test_slowdown_over_threshold_of_median_is_a_regression():
+    history = [entry(10.0), entry(11.0), entry(12.0)]
+    assert find_regressions(entry(13.0), history, threshold=0.2) == []
+    assert find_regressions(entry(14.5), history, threshold=0.2) == [
+        "150 markets, cycle 0: cycle_seconds 14.50 vs median 11.00"
+    ]
+    assert find_regressions(entry(11.0, peak_rss_mb=130.0), history, threshold=0.2) == [
+        "150 markets, cycle 0: peak_rss_mb 130.00 vs median 100.00"
+    ]
+
+def test_only_last_comparable_runs_form_the_baseline():
+    history = [entry(1.0)] * 5 + [entry(10.0)] * 5
+    # Старые быстрые прогоны вышли из окна медианы
+    assert find_regressions(entry(11.0), history, threshold=0.2) == []
+    assert find_regressions(entry(11.0), history, threshold=0.2, window=10) != []
+
+    other_runs = [entry(1.0, host='laptop'), entry(1.0, options={**OPTIONS, 'cycles': 2}),
+                  entry(1.0, scale='10')]
+    assert find_regressions(entry(11.0), other_runs, threshold=0.2) == []
+    assert find_regressions(entry(11.0), [], threshold=0.2) == []
@@ -0,0 +1,55 @@
+import importlib
+import json
+
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # data_combiner при импорте открывает лог, а агрегаты читаются из текущего каталога
+    monkeypatch.chdir(tmp_path)
+    web_server = importlib.import_module('web_server')
+    data_combiner = importlib.import_module('data_combiner')
+
+    times = pd.date_range('2024-11-30 22:00', periods=24, freq='5min')
+    pd.DataFrame({
+        'market': 'BTC/USDT',
+        'candle_date_time_utc': times.strftime('%Y-%m-%dT%H:%M:%S'),
+        'opening_price': 100.0,
+        'high_price': 101.0,
+        'low_price': 99.0,
+        'trade_price': 100.0,
+        'candle_acc_trade_volume': 1.0
+    }).to_csv(tmp_path / 'upbit.csv', index=False)
+    pd.DataFrame({
+        'market': 'BTC/USDT',
+        'candle_date_time_utc': times.strftime('%Y-%m-%d %H:%M:%S'),
+        'opening_price': 100.0,
+        'high_price': 101.0,
+        'low_price': 99.0,
+        # В первый час цены Binance нет: цена закрытия и премия - NaN
+        'close_price': [float('nan')] * 12 + [100.0] * 12,
+        'volume': 2.0
+    }).to_csv(tmp_path / 'binance.csv', index=False)
+
+    combiner = data_combiner.DataCombiner()
+    combiner.combine_data(tmp_path / 'upbit.csv', tmp_path / 'binance.csv')
+    combiner.save_combined_data()
+    combiner.save_rollups()
+    return web_server.app.test_client()
+
+def test_rollups_endpoint_returns_valid_json(client):
+    response = client.get('/api/rollups?resolution=1h')
+    assert response.status_code == 200
+    # Строгий разбор, как JSON.parse в браузере
+    rows = json.loads(response.get_data(as_text=True),
+                      parse_constant=lambda name: pytest.fail(f"{name} in response"))
+    assert [row['premium_percent_max'] for row in rows] == [None, pytest.approx(0.0)]
+    assert rows[0]['close_price_binance'] is None
+
+def test_rollups_endpoint_takes_resolution_in_ms(client):
+    by_name = client.get('/api/rollups?resolution=1h').get_json()
+    by_ms = client.get('/api/rollups?resolution=3600000')
+    assert by_ms.status_code == 200
+    assert by_ms.get_json() == by_name
+    assert client.get('/api/rollups?resolution=3').status_code == 400
@@ -3,6 +3,7 @@ import pandas as pd
 import threading
 import time
 from datetime import datetime
+from data_combiner import query_saved_rollups
 
 app = Flask(__name__)
 latest_data = None
@@ -15,13 +16,43 @@ def update_data_endpoint():
             global latest_data
             latest_data = pd.DataFrame(data)
             print(latest_data)
-            latest_data['DateTime'] = pd.to_datetime(latest_data['candle_date_time_utc_x'])
+            # Время храним как int64 мс от эпохи; строки разбираются только для старого формата
+            if 'timestamp_upbit' in latest_data.columns:
+                latest_data['DateTime'] = latest_data['timestamp_upbit'].astype('int64')
+            else:
+                times = pd.to_datetime(latest_data['candle_date_time_utc_x'])
+                latest_data['DateTime'] = (times - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)
             latest_data = latest_data.sort_values('DateTime', ascending=False)
             return jsonify({"status": "success"})
         return jsonify({"status": "error", "message": "No data received"}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def _ms_arg(name: str, default=None):
+    """Параметр запроса в мс (только цифры) или строкой ('1h', '2024-11-30 14:00')"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    return int(value) if value.isdigit() else value
+
+@app.route('/api/rollups')
+def rollups_endpoint():
+    """Агрегаты за период: ?resolution=1h&start=...&end=...&market=BTC/USDT"""
+    try:
+        data = query_saved_rollups(
+            _ms_arg('resolution', '1h'),
+            start=_ms_arg('start'),
+            end=_ms_arg('end'),
+            markets=request.args.getlist('market') or None
+        )
+        # NaN не является JSON: пустые минимумы премии и цены отдаются как null
+        data = data.astype(object).where(data.notna(), None)
+        return jsonify(data.to_dict('records'))
+    except FileNotFoundError:
+        return jsonify({"status": "error", "message": "Rollups are not saved yet"}), 404
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
 @app.route('/')
 def index():
     if latest_data is None:
@@ -29,7 +60,7 @@ def index():
     
     try:
         display_data = latest_data.copy()
-        display_data['DateTime'] = display_data['DateTime'].dt.strftime('%Y-%m-%d %H:%M')
+        display_data['DateTime'] = pd.to_datetime(display_data['DateTime'], unit='ms').dt.strftime('%Y-%m-%d %H:%M')
         
         # Округляем числовые колонки для лучшего отображения
         numeric_columns = [